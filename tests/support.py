@@ -0,0 +1,51 @@
+"""
+Shared helpers for the integrity checker tests
+"""
+
+import json
+import os
+import tempfile
+import unittest
+
+import integrity_checker as ic
+
+
+class TempDirTestCase(unittest.TestCase):
+    """Run each test inside a fresh temporary working directory"""
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+        self.addCleanup(os.chdir, os.getcwd())
+        os.chdir(self.tmp.name)
+
+    def write(self, path, data=b'data'):
+        """Create a file (and its parent directories) with the given content"""
+        parent = os.path.dirname(path)
+        if parent:
+            os.makedirs(parent, exist_ok=True)
+        with open(path, 'wb' if isinstance(data, bytes) else 'w') as f:
+            f.write(data)
+
+    def checker(self, **config):
+        """
+        Create a checker with a config file in the temporary directory
+
+        Reports are not written and nothing is spooled unless the test asks.
+        """
+        settings = {'alert_spool_dir': None, 'report_dir': 'reports'}
+        settings.update(config)
+        with open('config.json', 'w') as f:
+            json.dump(settings, f)
+        checker = ic.FileIntegrityChecker('config.json')
+        checker.generate_report = lambda report: None
+        self.addCleanup(self._close, checker)
+        return checker
+
+    @staticmethod
+    def _close(checker):
+        checker.close(timeout=5)
+        if checker.baseline is not None:
+            checker.baseline.close()
+        if checker.cache is not None:
+            checker.cache.close()
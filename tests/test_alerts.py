@@ -0,0 +1,146 @@
+"""
+Tests for alert delivery
+"""
+
+import time
+import unittest
+from unittest import mock
+
+import integrity_checker as ic
+from tests.support import TempDirTestCase
+
+
+class FakeSMTP:
+    """Stand-in for smtplib.SMTP recording the messages sent"""
+
+    sent = []
+
+    def __init__(self, host, port, timeout):
+        pass
+
+    def send_message(self, message):
+        FakeSMTP.sent.append(message['Subject'])
+
+    def quit(self):
+        pass
+
+
+class AlertDeliveryTests(TempDirTestCase):
+
+    def setUp(self):
+        super().setUp()
+        FakeSMTP.sent = []
+        patcher = mock.patch.object(ic.smtplib, 'SMTP', FakeSMTP)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.write('data/a', b'a')
+
+    def changed_checker(self, **config):
+        checker = self.checker(monitor_paths=['data'], alert_email='admin@example.com', **config)
+        checker.create_baseline()
+        self.write('data/a', b'changed')
+        return checker
+
+    def test_one_shot_check_delivers_on_close(self):
+        checker = self.changed_checker()
+        checker.check_integrity()
+        checker.close()
+        self.assertEqual(FakeSMTP.sent, ['File Integrity Alert'])
+
+    def test_held_digest_is_flushed_on_close(self):
+        checker = self.changed_checker(alert_digest_window=3600)
+        checker.check_integrity()
+        time.sleep(0.1)
+        self.assertEqual(FakeSMTP.sent, [])
+        checker.close()
+        self.assertEqual(FakeSMTP.sent, ['File Integrity Alert'])
+
+    def test_spooled_alerts_of_earlier_runs_are_sent(self):
+        spool = ic.AlertSpool('spool')
+        spool.add({'changes': [{'file': 'earlier'}]})
+        checker = self.checker(alert_email='admin@example.com', alert_spool_dir='spool')
+        checker.raise_alerts({'mode': 'full', 'changes': [], 'missing_files': []})
+        checker.close()
+        self.assertEqual(FakeSMTP.sent, ['File Integrity Alert'])
+        self.assertEqual(spool.pending(), [])
+
+
+def report(mode='full', **sections):
+    result = {'timestamp': 't', 'mode': mode, 'changes': [], 'metadata_changes': [],
+              'missing_files': [], 'moved_files': []}
+    result.update(sections)
+    return result
+
+
+def change(path, current='new'):
+    return {'file': path, 'expected_hash': 'old', 'current_hash': current}
+
+
+class AlertAggregatorTests(unittest.TestCase):
+
+    def setUp(self):
+        self.sent = []
+
+    def aggregator(self, **options):
+        return ic.AlertAggregator(self.sent.append, **options)
+
+    def alerted(self):
+        return [[item['file'] if isinstance(item, dict) else item
+                 for section in ('changes', 'missing_files') for item in sent.get(section, ())]
+                for sent in self.sent]
+
+    def test_threshold_one_alerts_each_finding_once(self):
+        aggregator = self.aggregator()
+        aggregator.add(report(changes=[change('a')]))
+        aggregator.add(report(changes=[change('a')]))
+        aggregator.add(report(changes=[change('a', current='newer')]))
+        aggregator.add(report())
+        aggregator.add(report(changes=[change('a', current='newer')]))
+        self.assertEqual(self.alerted(), [['a'], ['a'], ['a']])
+
+    def test_consecutive_threshold(self):
+        aggregator = self.aggregator(threshold=3)
+        aggregator.add(report(changes=[change('a')], missing_files=['m']))
+        aggregator.add(report(changes=[change('a')]))  # 'm' cleared
+        aggregator.add(report(missing_files=['m']))  # 'a' cleared
+        aggregator.add(report(changes=[change('a')], missing_files=['m']))
+        self.assertEqual(self.sent, [])
+        aggregator.add(report(changes=[change('a')], missing_files=['m']))
+        self.assertEqual(self.alerted(), [['m']])
+        aggregator.add(report(changes=[change('a')]))
+        self.assertEqual(self.alerted(), [['m'], ['a']])
+
+    def test_cumulative_threshold(self):
+        aggregator = self.aggregator(threshold=2, mode='cumulative')
+        aggregator.add(report(changes=[change('a')]))
+        aggregator.add(report())
+        aggregator.add(report(changes=[change('a')]))
+        self.assertEqual(self.alerted(), [['a']])
+
+    def test_partial_reports_only_clear_what_they_cover(self):
+        aggregator = self.aggregator(threshold=2)
+        aggregator.add(report(changes=[change('x/a'), change('y/b')]))
+        aggregator.add(report(scope=['x']))
+        aggregator.add(report(mode='events'))
+        aggregator.add(report(range=['y/', 'z'], changes=[change('y/b')]))
+        aggregator.add(report(changes=[change('x/a')]))
+        self.assertEqual(self.alerted(), [['y/b']])
+
+    def test_digest_window(self):
+        with mock.patch.object(ic.threading, 'Timer') as timer:
+            aggregator = self.aggregator(window=60)
+            aggregator.add(report(changes=[change('a')]))
+            aggregator.add(report(missing_files=['b']))
+            timer.assert_called_once()
+            self.assertEqual(self.sent, [])
+            aggregator.flush()
+        self.assertEqual(len(self.sent), 1)
+        digest = self.sent[0]
+        self.assertEqual((digest['mode'], digest['reports']), ('digest', 2))
+        self.assertEqual(self.alerted(), [['a', 'b']])
+        aggregator.flush()
+        self.assertEqual(len(self.sent), 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
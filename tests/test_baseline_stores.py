@@ -0,0 +1,224 @@
+"""
+Tests for the baseline stores
+"""
+
+import json
+import os
+import sqlite3
+import unittest
+from unittest import mock
+
+import integrity_checker as ic
+from tests.support import TempDirTestCase
+
+EXTENSIONS = ('.json', '.db', '.bin')
+
+# SqliteBaselineStore schema before version 2; version 0 used TEXT paths
+LEGACY_SQLITE_SCHEMA = """
+    CREATE TABLE baseline (
+        path BLOB PRIMARY KEY,
+        parent BLOB NOT NULL,
+        hash TEXT,
+        size INTEGER,
+        mtime_ns INTEGER,
+        ctime_ns INTEGER,
+        inode INTEGER,
+        extra TEXT
+    ) WITHOUT ROWID;
+    CREATE INDEX idx_baseline_hash ON baseline (hash);
+    CREATE INDEX idx_baseline_parent ON baseline (parent);
+"""
+
+
+def sample_entries():
+    """
+    Entries whose paths share long prefixes and sort around os.sep in tricky
+    ways
+    """
+    paths = []
+    for top in ('d', 'd-x', 'd.x', 'dd'):
+        for i in range(12):
+            paths.append(f"{top}/file{i:02d}")
+        paths.append(f"{top}/sub/deep/name")
+    paths += ['d/a b', 'd/a/b', 'd/a-b', 'top', 'z/été', 'z/\U0001F600',
+              os.fsdecode(b'z/\xe9\xff')]
+    entries = {}
+    for i, path in enumerate(sorted(paths)):
+        entry = {'hash': f"{i:064x}", 'stat': [i, i * 1000, i * 1000 + 1, 100 + i],
+                 'algorithm': 'sha256'}
+        if i % 5 == 0:
+            entry['algorithm'] = 'blake2b'
+            entry['hash'] = f"{i:0128x}"
+        if i % 7 == 0:
+            entry['meta'] = [0o100644, 1000, 1000, 1]
+        if i % 11 == 0:
+            entry['append'] = [i, 'ab' * 32]
+        entries[path] = entry
+    entries['nohash'] = {'hash': None, 'stat': None}
+    return entries
+
+
+def normalized(entry):
+    """Reduce an entry to the fields every backend keeps"""
+    if entry is None:
+        return None
+    return (ic.entry_hash(entry), ic.entry_stat(entry), ic.entry_algorithm(entry),
+            ic.entry_meta(entry), entry.get('append') if isinstance(entry, dict) else None)
+
+
+class BaselineStoreTests(TempDirTestCase):
+
+    def check_store(self, store, entries):
+        paths = sorted(entries)
+        self.assertEqual([path for path, _ in store.items()], paths)
+        for path, entry in store.items():
+            self.assertEqual(normalized(entry), normalized(entries[path]), path)
+
+        # Point lookups, including paths between and around the stored ones
+        for path in paths + ['', 'a', 'd', 'd/', 'd/a', 'd/file0', 'zzz', 'top/']:
+            self.assertEqual(normalized(store.get(path)), normalized(entries.get(path)), path)
+
+        for directory in ('d', 'd/a', 'd/sub', 'dd', 'z', 'nothing'):
+            prefix = directory + os.sep
+            expected = [path for path in paths if path.startswith(prefix)]
+            self.assertEqual([path for path, _ in store.under(directory)], expected, directory)
+
+        bounds = [None, '', 'd', 'd/', 'd/file05', 'd-x', 'dd/sub', 'top', 'z/ÿ', '~']
+        for lo in bounds:
+            for hi in bounds:
+                expected = [path for path in paths
+                            if (lo is None or path >= lo) and (hi is None or path < hi)]
+                self.assertEqual([path for path, _ in store.between(lo, hi)], expected, (lo, hi))
+
+    def test_round_trip(self):
+        entries = sample_entries()
+        for extension in EXTENSIONS:
+            with self.subTest(backend=extension):
+                store = ic.open_baseline_file('baseline' + extension)
+                store.replace(entries)
+                store.close()
+                store = ic.open_baseline_file('baseline' + extension)
+                self.check_store(store, entries)
+                store.close()
+
+    def test_update_inserts_and_replaces(self):
+        entries = sample_entries()
+        changes = {'d/file00': {'hash': 'ff' * 32, 'stat': [1, 2, 3, 4], 'algorithm': 'sha256'},
+                   'd/file05b': {'hash': 'ee' * 32, 'stat': [5, 6, 7, 8], 'algorithm': 'sha256'},
+                   'a': {'hash': 'dd' * 32, 'stat': None, 'algorithm': 'sha256'}}
+        for extension in EXTENSIONS:
+            with self.subTest(backend=extension):
+                store = ic.open_baseline_file('baseline' + extension)
+                store.replace(entries)
+                store.update(changes)
+                store.close()
+                expected = dict(entries, **changes)
+                self.check_store(ic.open_baseline_file('baseline' + extension), expected)
+
+    def test_empty_store(self):
+        for extension in EXTENSIONS:
+            with self.subTest(backend=extension):
+                store = ic.open_baseline_file('baseline' + extension)
+                store.replace({})
+                self.assertEqual(list(store.items()), [])
+                self.assertIsNone(store.get('anything'))
+                self.assertEqual(store.between('a', 'z'), [])
+                store.close()
+
+    def test_under_root_directories(self):
+        entries = {path: {'hash': 'aa' * 32, 'stat': None}
+                   for path in (os.sep + 'a', os.sep + 'd' + os.sep + 'b', 'relative')}
+        for extension in EXTENSIONS:
+            with self.subTest(backend=extension):
+                store = ic.open_baseline_file('baseline' + extension)
+                store.replace(entries)
+                self.assertEqual([path for path, _ in store.under(os.sep)],
+                                 [os.sep + 'a', os.sep + 'd' + os.sep + 'b'])
+                self.assertEqual([path for path, _ in store.under(os.sep + 'd' + os.sep)],
+                                 [os.sep + 'd' + os.sep + 'b'])
+                store.close()
+
+    def test_binary_rejects_other_files(self):
+        self.write('baseline.bin', b'not a baseline at all, just some text')
+        store = ic.BinaryBaselineStore('baseline.bin')
+        with self.assertRaises(ic.BinaryBaselineFormatError):
+            store.get('x')
+
+    def test_binary_reloads_replaced_file(self):
+        first = ic.BinaryBaselineStore('baseline.bin')
+        first.replace({'a': {'hash': 'aa' * 32, 'stat': None}})
+        self.assertIsNotNone(first.get('a'))
+        ic.BinaryBaselineStore('baseline.bin').replace({'b': {'hash': 'bb' * 32, 'stat': None}})
+        self.assertTrue(first.refresh())
+        self.assertIsNone(first.get('a'))
+        self.assertIsNotNone(first.get('b'))
+        first.close()
+
+    def test_binary_write_is_synced_before_the_rename(self):
+        store = ic.BinaryBaselineStore('baseline.bin')
+        store.replace({'a': {'hash': 'aa' * 32, 'stat': [1, 2, 3, 4]}})
+        with mock.patch.object(ic.os, 'fsync', side_effect=OSError('I/O error')):
+            with self.assertRaises(OSError):
+                store.update({'b': {'hash': 'bb' * 32, 'stat': [1, 2, 3, 4]}})
+        store.close()
+        self.assertEqual([path for path, _ in store.items()], ['a'])
+        store.close()
+
+    def test_json_write_is_atomic(self):
+        store = ic.JsonBaselineStore('baseline.json')
+        store.replace({'a': {'hash': 'aa' * 32, 'stat': [1, 2, 3, 4]}})
+        with mock.patch.object(ic.json, 'dump', side_effect=OSError('disk full')):
+            with self.assertRaises(OSError):
+                store.update({'b': {'hash': 'bb' * 32, 'stat': [1, 2, 3, 4]}})
+        with open('baseline.json') as f:
+            self.assertEqual(list(json.load(f)), ['a'])
+
+    def test_sqlite_migrates_older_schemas(self):
+        for version, path_type in ((0, 'TEXT'), (1, 'BLOB')):
+            with self.subTest(version=version):
+                database = f'baseline{version}.db'
+                conn = sqlite3.connect(database)
+                conn.executescript(LEGACY_SQLITE_SCHEMA.replace('BLOB', path_type))
+                conn.execute(f"PRAGMA user_version = {version}")
+                rows = [('d/b', 'd', 'bb', 1, 2, 3, 4, None),
+                        ('d/a', 'd', 'aa', 1, 2, 3, 4, '{"algorithm":"sha256"}')]
+                if path_type == 'BLOB':
+                    rows = [(path.encode(), parent.encode(), *rest) for path, parent, *rest in rows]
+                conn.executemany("INSERT INTO baseline VALUES (?, ?, ?, ?, ?, ?, ?, ?)", rows)
+                conn.commit()
+                conn.close()
+
+                store = ic.SqliteBaselineStore(database)
+                store.update({'d/é': {'hash': 'cc', 'stat': None},
+                              os.fsdecode(b'd/\xff'): {'hash': 'dd', 'stat': None}})
+                self.assertEqual([path for path, _ in store.items()],
+                                 ['d/a', 'd/b', 'd/é', os.fsdecode(b'd/\xff')])
+                self.assertEqual(store.get('d/a'), {'hash': 'aa', 'stat': [1, 2, 3, 4],
+                                                    'algorithm': 'sha256'})
+                self.assertEqual([path for path, _ in store.under('d')][:2], ['d/a', 'd/b'])
+                store.close()
+
+                conn = sqlite3.connect(database)
+                columns = [row[1] for row in conn.execute("PRAGMA table_info(baseline)")]
+                indexes = conn.execute("SELECT name FROM sqlite_master WHERE type = 'index' "
+                                       "AND name LIKE 'idx_%'").fetchall()
+                version = conn.execute("PRAGMA user_version").fetchone()[0]
+                conn.close()
+                self.assertNotIn('parent', columns)
+                self.assertEqual(indexes, [])
+                self.assertEqual(version, ic.SqliteBaselineStore.SCHEMA_VERSION)
+
+    def test_convert_between_all_formats(self):
+        entries = sample_entries()
+        ic.open_baseline_file('source.json').replace(entries)
+        for extension in EXTENSIONS:
+            with self.subTest(backend=extension):
+                destination = 'converted' + extension
+                self.assertEqual(ic.convert_baseline('source.json', destination), len(entries))
+                self.check_store(ic.open_baseline_file(destination), entries)
+                # A fresh tree is written for the destination
+                ic.MerkleTree.load(destination)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,183 @@
+"""
+End-to-end tests of integrity checks
+"""
+
+import json
+import os
+import unittest
+from unittest import mock
+
+import integrity_checker as ic
+from tests.support import TempDirTestCase
+
+
+class CheckTests(TempDirTestCase):
+
+    def test_quick_and_full_checks(self):
+        self.write('data/a', b'a')
+        self.write('data/b', b'b')
+        checker = self.checker(monitor_paths=['data'], verification_mode='quick')
+        checker.create_baseline()
+        report = checker.check_integrity()
+        self.assertEqual((report['mode'], report['files_rehashed'], report['changes']), ('quick', 0, []))
+
+        self.write('data/a', b'A')
+        self.write('data/c', b'c')
+        os.remove('data/b')
+        report = checker.check_integrity()
+        self.assertEqual([change['file'] for change in report['changes']], ['data/a'])
+        self.assertEqual(report['missing_files'], ['data/b'])
+        self.assertEqual(report['new_files'], ['data/c'])
+
+    def test_quick_mode_carries_over_to_new_processes(self):
+        self.write('data/a', b'a')
+        config = {'monitor_paths': ['data'], 'verification_mode': 'quick'}
+        self.checker(**config).create_baseline()
+        report = self.checker(**config).check_integrity()
+        self.assertEqual((report['mode'], report['files_rehashed']), ('quick', 0))
+
+        # Once the saved full rehash is older than the interval, the next
+        # process rehashes everything, and records it for the one after
+        with open('baseline_hashes.json.state') as f:
+            state = json.load(f)
+        state['last_full_check'] -= 86400
+        with open('baseline_hashes.json.state', 'w') as f:
+            json.dump(state, f)
+        self.assertEqual(self.checker(**config).check_integrity()['mode'], 'full')
+        self.assertEqual(self.checker(**config).check_integrity()['mode'], 'quick')
+
+    def test_full_check_catches_content_change_with_same_stat(self):
+        self.write('data/a', b'aaaa')
+        checker = self.checker(monitor_paths=['data'], verification_mode='full')
+        checker.create_baseline()
+        st = os.stat('data/a')
+        self.write('data/a', b'bbbb')
+        os.utime('data/a', ns=(st.st_atime_ns, st.st_mtime_ns))
+        self.assertEqual([change['file'] for change in checker.check_integrity()['changes']],
+                         ['data/a'])
+
+    def test_files_are_verified_in_bounded_batches(self):
+        for index in range(10):
+            self.write(f"data/f{index:02d}", str(index))
+        for backend in ('json', 'sqlite', 'binary'):
+            with self.subTest(backend=backend):
+                checker = self.checker(monitor_paths=['data'], baseline_backend=backend,
+                                       verify_batch_size=3)
+                checker.create_baseline()
+                os.utime('data/f07', ns=(0, 0))
+                batches = []
+
+                def hash_files(file_paths, *args, hash_files=checker.hash_files, **kwargs):
+                    batches.append(list(file_paths))
+                    return hash_files(batches[-1], *args, **kwargs)
+
+                with mock.patch.object(checker, 'hash_files', hash_files):
+                    report = checker.check_integrity()
+                self.assertEqual([len(batch) for batch in batches], [3, 3, 3, 1])
+                self.assertEqual((report['changes'], report['files_rehashed']), ([], 10))
+                # The refreshed stat signature is written back after the stream
+                self.assertEqual(checker.open_baseline().get('data/f07')['stat'],
+                                 ic.stat_signature(os.stat('data/f07')))
+
+    def test_non_utf8_names_in_every_backend(self):
+        name = os.path.join(b'data', b'\xff\xfename')
+        self.write(name, b'x')
+        for backend in ('json', 'sqlite', 'binary'):
+            with self.subTest(backend=backend):
+                checker = self.checker(monitor_paths=['data'], baseline_backend=backend)
+                checker.create_baseline()
+                report = checker.check_integrity()
+                self.assertEqual((report['changes'], report['new_files'], report['missing_files']),
+                                 ([], [], []))
+                self.assertIsNotNone(checker.open_baseline().get(os.fsdecode(name)))
+
+
+class AppendOnlyTests(TempDirTestCase):
+
+    def checker_for(self, mode):
+        self.write('logs/app.log', b'a' * 200000)
+        checker = self.checker(monitored_files=[{'path': 'logs', 'append_only': True}],
+                               verification_mode=mode)
+        checker.create_baseline()
+        return checker
+
+    def test_appends_are_accepted(self):
+        checker = self.checker_for('full')
+        with open('logs/app.log', 'ab') as f:
+            f.write(b'b' * 100)
+        report = checker.check_integrity()
+        self.assertEqual(report['appended_files'], [{'file': 'logs/app.log', 'bytes': 100}])
+        self.assertEqual(report['changes'], [])
+
+    def test_unchanged_files_do_not_rewrite_the_baseline(self):
+        checker = self.checker_for('full')
+        checker.check_integrity()
+        baseline = checker.open_baseline()
+        with mock.patch.object(baseline, 'update', wraps=baseline.update) as update, \
+                mock.patch.object(ic.MerkleTree, 'invalidate') as invalidate:
+            for _ in range(2):
+                report = checker.check_integrity()
+                self.assertEqual((report['changes'], report['appended_files']), ([], []))
+        update.assert_not_called()
+        invalidate.assert_not_called()
+
+    def test_full_check_catches_prefix_rewrite(self):
+        checker = self.checker_for('full')
+        with open('logs/app.log', 'ab') as f:
+            f.write(b'b' * 100)
+        checker.check_integrity()
+        with open('logs/app.log', 'r+b') as f:
+            f.write(b'XXXXX')
+        with open('logs/app.log', 'ab') as f:
+            f.write(b'c' * 100)
+        report = checker.check_integrity()
+        self.assertEqual([change['file'] for change in report['changes']], ['logs/app.log'])
+
+    def test_truncation(self):
+        checker = self.checker_for('quick')
+        os.truncate('logs/app.log', 1000)
+        change, = checker.check_integrity()['changes']
+        self.assertTrue(change['truncated'])
+
+    def test_tree_follows_refreshed_entries(self):
+        checker = self.checker_for('full')
+        ic.convert_baseline('baseline_hashes.json', 'original.json')
+        with open('logs/app.log', 'ab') as f:
+            f.write(b'more')
+        checker.check_integrity()
+        self.assertEqual(checker.compare_baseline('original.json')['changed'], ['logs/app.log'])
+
+
+class MoveDetectionTests(TempDirTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.write('data/a', b'AAAA')
+        self.write('data/b', b'BBBB')
+        self.checker_ = self.checker(monitor_paths=['data'], verification_mode='quick')
+        self.checker_.create_baseline()
+
+    def test_rename_and_copy(self):
+        os.rename('data/a', 'data/a2')
+        self.write('data/b2', b'BBBB')
+        os.remove('data/b')
+        report = self.checker_.check_integrity()
+        self.assertEqual(report['moved_files'], [
+            {'from': 'data/a', 'to': 'data/a2', 'match': 'inode'},
+            {'from': 'data/b', 'to': 'data/b2', 'match': 'hash'}
+        ])
+        self.assertEqual((report['missing_files'], report['new_files']), ([], []))
+
+    def test_replacement_with_reused_inode_is_not_a_move(self):
+        st = os.stat('data/a')
+        os.remove('data/a')
+        self.write('data/evil', b'EVIL')
+        os.utime('data/evil', ns=(st.st_atime_ns, st.st_mtime_ns))
+        report = self.checker_.check_integrity()
+        self.assertEqual(report['moved_files'], [])
+        self.assertEqual(report['missing_files'], ['data/a'])
+        self.assertEqual(report['new_files'], ['data/evil'])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,96 @@
+"""
+Tests for event-driven monitoring
+"""
+
+import os
+import sys
+import unittest
+
+import integrity_checker as ic
+from tests.support import TempDirTestCase
+
+
+class ChangeDebouncerTests(unittest.TestCase):
+
+    def test_quiet_window(self):
+        debouncer = ic.ChangeDebouncer(window=1.0)
+        debouncer.add(['a'], now=10.0)
+        debouncer.add(['a', 'b'], now=10.5)
+        self.assertEqual(debouncer.next_deadline(), 11.5)
+        self.assertEqual(debouncer.settled(now=11.4), [])
+        self.assertEqual(sorted(debouncer.settled(now=11.5)), ['a', 'b'])
+        self.assertIsNone(debouncer.next_deadline())
+
+    def test_max_delay_caps_continuous_writes(self):
+        debouncer = ic.ChangeDebouncer(window=1.0, max_delay=3.0)
+        for tick in range(6):
+            debouncer.add(['log'], now=100.0 + tick * 0.5)
+        self.assertEqual(debouncer.next_deadline(), 103.0)
+        self.assertEqual(debouncer.settled(now=102.9), [])
+        self.assertEqual(debouncer.settled(now=103.0), ['log'])
+        # The next burst starts a new delay
+        debouncer.add(['log'], now=103.5)
+        self.assertEqual(debouncer.next_deadline(), 104.5)
+
+    def test_clear(self):
+        debouncer = ic.ChangeDebouncer(window=1.0)
+        debouncer.add(['a'], now=0)
+        debouncer.clear()
+        self.assertEqual(debouncer.settled(now=10), [])
+
+
+@unittest.skipUnless(sys.platform.startswith('linux'), "inotify is Linux only")
+class InotifyWatcherTests(TempDirTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.write('root/sub/file', b'1')
+        self.write('single/watched', b'1')
+        self.write('single/other', b'1')
+        try:
+            self.watcher = ic.InotifyWatcher()
+        except OSError as e:
+            self.skipTest(f"inotify unavailable: {e}")
+        self.addCleanup(self.watcher.close)
+
+    def events(self):
+        files, directories = set(), set()
+        while True:
+            new_files, new_directories, overflow = self.watcher.read_events(0.2)
+            self.assertFalse(overflow)
+            if not new_files and not new_directories:
+                return files, directories
+            files |= new_files
+            directories |= new_directories
+
+    def test_tree_events(self):
+        self.assertEqual(self.watcher.add_tree('root'), 2)
+        self.write('root/sub/file', b'2')
+        self.write('root/new', b'1')
+        files, _ = self.events()
+        self.assertEqual(files, {'root/sub/file', 'root/new'})
+
+        # New directories are watched as they appear
+        os.mkdir('root/created')
+        _, directories = self.events()
+        self.assertEqual(directories, {'root/created'})
+        self.write('root/created/inner', b'1')
+        files, _ = self.events()
+        self.assertIn('root/created/inner', files)
+
+        os.rename('root/created', 'root/renamed')
+        _, directories = self.events()
+        self.assertEqual(directories, {'root/created', 'root/renamed'})
+        self.assertNotIn('root/created', self.watcher.directories)
+        self.assertIn('root/renamed', self.watcher.directories)
+
+    def test_single_file_filter(self):
+        self.watcher.add_file('single/watched')
+        self.write('single/other', b'2')
+        self.write('single/watched', b'2')
+        files, _ = self.events()
+        self.assertEqual(files, {'single/watched'})
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,334 @@
+"""
+Tests for hashing files
+"""
+
+import hashlib
+import os
+import unittest
+from unittest import mock
+
+import integrity_checker as ic
+from tests.support import TempDirTestCase
+
+
+class ParallelHashingTests(TempDirTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.files = {}
+        for index in range(6):
+            path = os.path.join('data', f"file{index}")
+            self.files[path] = os.urandom(1000 * index)
+            self.write(path, self.files[path])
+
+    def test_every_pool_gives_the_same_entries(self):
+        expected = {path: hashlib.sha256(data).hexdigest() for path, data in self.files.items()}
+        for executor, workers in (('thread', 1), ('thread', 4), ('process', 2)):
+            with self.subTest(executor=executor, workers=workers):
+                checker = self.checker(hash_executor=executor, hash_workers=workers)
+                entries = checker.hash_files(reversed(list(self.files)))
+                self.assertEqual(list(entries), sorted(self.files))
+                self.assertEqual({path: entry['hash'] for path, entry in entries.items()}, expected)
+                for path, entry in entries.items():
+                    self.assertEqual(entry['stat'], ic.stat_signature(os.stat(path)))
+                    self.assertEqual(entry['algorithm'], 'sha256')
+
+    def test_unreadable_files_have_no_hash(self):
+        checker = self.checker(hash_workers=2)
+        entries = checker.hash_files(['data/file1', 'data/missing'])
+        self.assertIsNotNone(entries['data/file1']['hash'])
+        self.assertEqual((entries['data/missing']['hash'], entries['data/missing']['stat']),
+                         (None, None))
+
+
+class HashFileTests(TempDirTestCase):
+
+    def test_hash_file_matches_hashlib(self):
+        data = os.urandom(3 * 1024 * 1024 + 17)
+        self.write('big', data)
+        for algorithm in ic.SUPPORTED_ALGORITHMS:
+            with self.subTest(algorithm=algorithm):
+                self.assertEqual(ic.hash_file('big', algorithm, buffer_size=65536),
+                                 hashlib.new(algorithm, data).hexdigest())
+
+    def test_empty_file(self):
+        self.write('empty', b'')
+        self.assertEqual(ic.hash_file('empty'), hashlib.sha256().hexdigest())
+
+
+class TokenBucketTests(unittest.TestCase):
+
+    def test_burst_then_debt(self):
+        clock = [100.0]
+        with mock.patch.object(ic.time, 'monotonic', lambda: clock[0]), \
+                mock.patch.object(ic.time, 'sleep') as sleep:
+            bucket = ic.TokenBucket(rate=10, burst=5)
+            self.assertEqual(bucket.consume(5), 0)
+            self.assertAlmostEqual(bucket.consume(10), 1.0)
+            sleep.assert_called_once()
+            # A second later the debt is paid off, but nothing was refilled
+            clock[0] += 1.0
+            self.assertAlmostEqual(bucket.consume(2), 0.2)
+            # Refills never exceed the burst size
+            clock[0] += 100.0
+            self.assertEqual(bucket.consume(5), 0)
+
+
+class ReadThrottleTests(TempDirTestCase):
+
+    def setUp(self):
+        super().setUp()
+        for index, size in enumerate((100, 2000, 30000)):
+            self.write(os.path.join('data', f"file{index}"), os.urandom(size))
+        self.files = sorted(os.path.join('data', name) for name in os.listdir('data'))
+        self.read = []
+        self.opened = []
+        for method, calls in (('read', self.read), ('file', self.opened)):
+            patcher = mock.patch.object(ic.ReadThrottle, method,
+                                        lambda throttle, *args, calls=calls: calls.append(args))
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def test_unlimited_checker_has_no_throttle(self):
+        self.assertIsNone(self.checker().read_throttle())
+
+    def test_throttle_is_shared_across_checks(self):
+        checker = self.checker(max_read_bytes_per_sec=1000000)
+        throttle = checker.read_throttle()
+        self.assertIsNotNone(throttle.bytes)
+        self.assertIsNone(throttle.files)
+        self.assertIs(checker.read_throttle(), throttle)
+        checker.config['max_files_per_sec'] = 10
+        self.assertIsNot(checker.read_throttle(), throttle)
+
+    def test_every_pool_accounts_for_all_reads(self):
+        for executor in ('thread', 'process'):
+            with self.subTest(executor=executor):
+                del self.read[:], self.opened[:]
+                checker = self.checker(hash_executor=executor, hash_workers=2,
+                                       max_read_bytes_per_sec=10 ** 9, max_files_per_sec=10 ** 6)
+                entries = checker.hash_files(self.files)
+                self.assertTrue(all(entry['hash'] for entry in entries.values()))
+                self.assertEqual(len(self.opened), 3)
+                self.assertEqual(sum(count for count, in self.read), 32100)
+
+    def test_process_pool_is_paced_by_file_size(self):
+        checker = self.checker(max_read_bytes_per_sec=10 ** 9)
+        self.assertEqual(list(checker._throttled(self.files + ['data/missing'])),
+                         self.files + ['data/missing'])
+        self.assertEqual(self.read, [(100,), (2000,), (30000,)])
+        self.assertEqual(len(self.opened), 4)
+
+
+class ReadPressureTests(unittest.TestCase):
+
+    def test_some_avg10_is_read(self):
+        psi = ("some avg10=12.50 avg60=3.00 avg300=1.00 total=100\n"
+               "full avg10=1.00 avg60=0.00 avg300=0.00 total=5\n")
+        with mock.patch.object(ic, 'open', mock.mock_open(read_data=psi), create=True) as opened:
+            self.assertEqual(ic.read_pressure('io'), 12.5)
+        opened.assert_called_once_with('/proc/pressure/io')
+
+    def test_unavailable(self):
+        with mock.patch.object(ic, 'open', side_effect=FileNotFoundError, create=True):
+            self.assertIsNone(ic.read_pressure('cpu'))
+        with mock.patch.object(ic, 'open', mock.mock_open(read_data='garbage'), create=True):
+            self.assertIsNone(ic.read_pressure('cpu'))
+
+
+class LoadMonitorTests(TempDirTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.readings = {}
+        for name, reader in (('read_pressure', self.readings.get),
+                             ('read_load_per_cpu', lambda: self.readings.get('load'))):
+            patcher = mock.patch.object(ic, name, reader)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def test_workers_follow_the_pressure(self):
+        monitor = ic.LoadMonitor(8, io_pressure=10, cpu_pressure=50, sample_interval=0)
+        sequence = []
+        for io in (5, 15, 15, 25, 5, 5, 0):
+            self.readings['io'] = io
+            sequence.append(monitor.workers())
+        self.assertEqual(sequence, [8, 4, 2, 0, 1, 2, 3])
+
+    def test_unset_limits_and_readings_are_ignored(self):
+        self.readings.update(io=1000, cpu=None, load=4.0)
+        monitor = ic.LoadMonitor(4, cpu_pressure=50, load_per_cpu=2.0, sample_interval=0)
+        self.assertEqual(monitor.pressure(), 2.0)
+        self.readings['load'] = None
+        self.assertEqual(monitor.pressure(), 0.0)
+
+    def test_samples_are_rate_limited(self):
+        clock = [0.0]
+        with mock.patch.object(ic.time, 'monotonic', lambda: clock[0]):
+            monitor = ic.LoadMonitor(8, io_pressure=10, sample_interval=1.0)
+            self.readings['io'] = 15
+            self.assertEqual(monitor.workers(), 4)
+            clock[0] = 0.5
+            self.assertEqual(monitor.workers(), 4)
+            clock[0] = 1.0
+            self.assertEqual(monitor.workers(), 2)
+
+    def test_wait_pauses_until_the_pressure_drops(self):
+        monitor = ic.LoadMonitor(8, io_pressure=10, sample_interval=0)
+        self.readings['io'] = 30
+        pauses = []
+
+        def sleep(seconds):
+            pauses.append(seconds)
+            if len(pauses) == 3:
+                self.readings['io'] = 0
+
+        with mock.patch.object(ic.time, 'sleep', sleep):
+            self.assertEqual(monitor.wait(5), 1)
+        self.assertEqual(pauses, [5, 5, 5])
+
+    def test_checker_hashes_in_batches_sized_by_the_monitor(self):
+        for index in range(5):
+            self.write(os.path.join('data', f"file{index}"), str(index))
+        checker = self.checker(adaptive_load=True, load_batch_size=2, hash_workers=4,
+                               max_io_pressure=10)
+        self.readings['io'] = 15
+        with mock.patch.object(checker, '_hash_batch', wraps=checker._hash_batch) as batch:
+            entries = checker.hash_files(os.path.join('data', name) for name in os.listdir('data'))
+        self.assertTrue(all(entry['hash'] for entry in entries.values()))
+        self.assertEqual([(len(call.args[0]), call.args[3]) for call in batch.call_args_list],
+                         [(2, 2), (2, 2), (1, 2)])
+        # The monitor is kept, so the next check starts from the reduced pool
+        self.assertIs(checker.load_monitor(4), checker.load)
+        self.assertEqual(checker.load.current, 2)
+
+
+class HashCacheTests(TempDirTestCase):
+
+    def key(self, inode, size=1):
+        return (1, inode, 'sha256', size, 2, 3)
+
+    def test_hits_need_a_matching_signature(self):
+        cache = ic.HashCache('cache.db', 10)
+        self.addCleanup(cache.close)
+        cache.put_many({self.key(1): 'aa', self.key(2): 'bb'})
+        self.assertEqual(cache.get_many([self.key(1), self.key(2, size=5), self.key(3)]),
+                         {self.key(1): 'aa'})
+        # Rows survive reopening the database
+        cache.close()
+        self.assertEqual(ic.HashCache('cache.db', 10).get_many([self.key(2)]), {self.key(2): 'bb'})
+
+    def test_least_recently_used_rows_are_evicted(self):
+        clock = iter(range(1, 100))
+        with mock.patch.object(ic.time, 'time_ns', lambda: next(clock)):
+            cache = ic.HashCache('cache.db', 2)
+            self.addCleanup(cache.close)
+            cache.put_many({self.key(1): 'aa'})
+            cache.put_many({self.key(2): 'bb'})
+            cache.get_many([self.key(1)])
+            cache.put_many({self.key(3): 'cc'})
+            found = cache.get_many([self.key(1), self.key(2), self.key(3)])
+        self.assertEqual(found, {self.key(1): 'aa', self.key(3): 'cc'})
+
+    def test_row_count_is_kept_without_counting(self):
+        cache = ic.HashCache('cache.db', 3)
+        self.addCleanup(cache.close)
+        cache.put_many({self.key(1): 'aa', self.key(2): 'bb'})
+        cache.put_many({self.key(2, size=5): 'cc', self.key(3): 'dd'})
+        self.assertEqual(cache.count, 3)
+        cache.put_many({self.key(4): 'ee', self.key(5): 'ff'})
+        self.assertEqual(cache.count, 3)
+        cache.close()
+        cache = ic.HashCache('cache.db', 3)
+        self.assertEqual(cache.get_many([self.key(5)]), {self.key(5): 'ff'})
+        self.assertEqual(cache.count, 3)
+        statements = []
+        cache.conn.set_trace_callback(statements.append)
+        cache.put_many({self.key(6): 'gg'})
+        self.assertFalse([sql for sql in statements if 'COUNT' in sql])
+        self.assertEqual(cache.count, 3)
+
+    def test_first_check_after_a_restart_uses_the_cache(self):
+        self.write('data/a', b'a')
+        self.write('data/b', b'b')
+        config = {'monitor_paths': ['data'], 'verification_mode': 'quick',
+                  'hash_cache': 'cache.db', 'hash_workers': 1}
+        self.checker(**config).create_baseline()
+        self.write('data/a', b'changed')
+        self.checker(**config).check_integrity()
+        # A changed file keeps differing from the baseline; the next process
+        # reports it again from the cache instead of reading it
+        checker = self.checker(**config)
+        with mock.patch.object(checker, '_hash_batch', wraps=checker._hash_batch) as batch:
+            report = checker.check_integrity()
+        self.assertEqual(report['mode'], 'quick')
+        self.assertEqual([change['file'] for change in report['changes']], ['data/a'])
+        self.assertEqual(batch.call_args.args[0], [])
+
+    def test_checker_reads_cached_and_hard_linked_files_once(self):
+        self.write('data/a', b'a')
+        os.link('data/a', 'data/b')
+        self.write('data/c', b'c')
+        checker = self.checker(hash_cache='cache.db', hash_workers=1)
+        with mock.patch.object(checker, '_hash_batch', wraps=checker._hash_batch) as batch:
+            first = checker.hash_files(['data/a', 'data/b', 'data/c'])
+            second = checker.hash_files(['data/a', 'data/b', 'data/c'])
+            self.write('data/c', b'C')
+            third = checker.hash_files(['data/a', 'data/b', 'data/c'])
+        self.assertEqual([call.args[0] for call in batch.call_args_list],
+                         [['data/a', 'data/c'], [], ['data/c']])
+        self.assertEqual(first, second)
+        self.assertEqual(first['data/b']['hash'], first['data/a']['hash'])
+        self.assertEqual(third['data/c']['hash'], hashlib.sha256(b'C').hexdigest())
+        # Uncached calls read every inode again, and refresh the cache
+        with mock.patch.object(checker, '_hash_batch', wraps=checker._hash_batch) as batch:
+            checker.hash_files(['data/a', 'data/b'], cached=False)
+        self.assertEqual(batch.call_args.args[0], ['data/a'])
+
+
+class ChunkTests(TempDirTestCase):
+
+    def test_chunk_manifest_and_changed_ranges(self):
+        data = bytearray(os.urandom(5000))
+        self.write('file', bytes(data))
+        digest, chunks = ic.hash_file_chunks('file', 'sha256', 1000)
+        self.assertEqual(digest, ic.hash_file('file'))
+        self.assertEqual(len(chunks), 5)
+        data[2500] ^= 0xff
+        data[2999] ^= 0xff
+        self.write('file', bytes(data) + b'tail')
+        _, current = ic.hash_file_chunks('file', 'sha256', 1000)
+        self.assertEqual(ic.changed_ranges(chunks, current, 1000, 5004), [[2000, 3000], [5000, 5004]])
+
+    def checked_change(self, early_exit):
+        data = bytearray(os.urandom(5000))
+        self.write('data/big', bytes(data))
+        checker = self.checker(monitor_paths=['data'], chunk_size=1000, chunk_min_size=4096,
+                               chunk_early_exit=early_exit)
+        checker.create_baseline()
+        self.assertEqual(checker.open_baseline().get('data/big')['chunks'][0], 1000)
+        data[1500] ^= 0xff
+        self.write('data/big', bytes(data))
+        change, = checker.check_integrity()['changes']
+        return change
+
+    def test_check_reports_changed_ranges(self):
+        change = self.checked_change(early_exit=False)
+        self.assertEqual(change['changed_ranges'], [[1000, 2000]])
+        self.assertIsNotNone(change['current_hash'])
+        self.assertNotIn('stopped_early', change)
+
+    def test_early_exit_stops_at_the_first_changed_chunk(self):
+        with mock.patch.object(ic, 'hash_file_chunks', wraps=ic.hash_file_chunks) as chunks:
+            change = self.checked_change(early_exit=True)
+        self.assertEqual(change['changed_ranges'], [[1000, 2000]])
+        self.assertIsNone(change['current_hash'])
+        self.assertTrue(change['stopped_early'])
+        # The check passed the baseline manifest and asked to stop early
+        file_path, _, chunk_size, expected, early_exit = chunks.call_args.args[:5]
+        self.assertEqual((file_path, chunk_size, len(expected), early_exit),
+                         ('data/big', 1000, 5, True))
+
+
+if __name__ == '__main__':
+    unittest.main()
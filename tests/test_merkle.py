@@ -0,0 +1,57 @@
+"""
+Tests for the Merkle directory digests
+"""
+
+import unittest
+
+import integrity_checker as ic
+from tests.support import TempDirTestCase
+from tests.test_baseline_stores import EXTENSIONS, sample_entries
+
+
+class MerkleTreeTests(TempDirTestCase):
+
+    def test_digests_follow_content(self):
+        entries = sample_entries()
+        tree = ic.MerkleTree.build(sorted(entries.items()))
+        same = ic.MerkleTree.build(sorted(entries.items()))
+        self.assertEqual(tree.directories, same.directories)
+        changed = dict(entries, **{'d/sub/deep/name': {'hash': '00' * 32, 'stat': None}})
+        other = ic.MerkleTree.build(sorted(changed.items()))
+        for directory in ('d/sub/deep', 'd/sub', 'd', ''):
+            self.assertNotEqual(tree.digest(directory), other.digest(directory), directory)
+        self.assertEqual(tree.digest('dd'), other.digest('dd'))
+        self.assertEqual(sorted(tree.files_under('d/sub')), ['d/sub/deep/name'])
+
+    def test_compare_baselines(self):
+        entries = sample_entries()
+        changed = dict(entries)
+        changed['d/file01'] = {'hash': '00' * 32, 'stat': None}
+        del changed['dd/file00']
+        changed['new/file'] = {'hash': '11' * 32, 'stat': None}
+        for first, second in (('a.json', 'b.bin'), ('a.db', 'b.json')):
+            with self.subTest(files=(first, second)):
+                ic.open_baseline_file(first).replace(entries)
+                ic.open_baseline_file(second).replace(changed)
+                result = ic.compare_baselines(first, second)
+                self.assertEqual(result['changed'], ['d/file01'])
+                self.assertEqual(result['only_in_first'], ['dd/file00'])
+                self.assertEqual(result['only_in_second'], ['new/file'])
+                self.assertGreater(result['directories_skipped'], 0)
+
+    def test_stale_tree_is_rebuilt(self):
+        entries = sample_entries()
+        for extension in EXTENSIONS:
+            with self.subTest(backend=extension):
+                original, current = 'original' + extension, 'current' + extension
+                ic.open_baseline_file(original).replace(entries)
+                store = ic.open_baseline_file(current)
+                store.replace(entries)
+                ic.MerkleTree.build(sorted(entries.items())).save(current)
+                store.update({'d/file02': {'hash': '00' * 32, 'stat': None}})
+                store.close()
+                self.assertEqual(ic.compare_baselines(current, original)['changed'], ['d/file02'])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,73 @@
+"""
+Tests for the sorted traversal and the baseline merge
+"""
+
+import os
+import unittest
+
+import integrity_checker as ic
+from tests.support import TempDirTestCase
+
+
+class ScanTreeTests(TempDirTestCase):
+
+    # Siblings such as 'a-b' and 'a.b' sort between the directory 'a' and 'a/'
+    NAMES = ['a b', 'a-b', 'a.b', 'a/a', 'a/b/c', 'a/b-c', 'a/b.c', 'a/bc', 'ab', 'b',
+             'B', 'é', 'z/\U0001F600', 'z/y/x']
+
+    def setUp(self):
+        super().setUp()
+        for name in self.NAMES:
+            self.write(os.path.join('root', name), name)
+        self.write(os.path.join(os.fsencode('root'), b'\xff\xfe'), b'raw')
+        self.files = sorted(os.path.join(directory, name)
+                            for directory, _, names in os.walk('root') for name in names)
+
+    def test_yields_sorted_paths(self):
+        scanned = [path for path, _ in ic.scan_tree('root')]
+        self.assertEqual(scanned, self.files)
+        self.assertEqual(scanned, sorted(scanned))
+
+    def test_symlinked_directories_are_not_followed(self):
+        os.symlink(os.path.abspath('root/z'), 'root/link')
+        scanned = [path for path, _ in ic.scan_tree('root')]
+        self.assertNotIn('root/link/y/x', scanned)
+        self.assertEqual(scanned, sorted(scanned))
+
+    def test_bounds_match_filtering(self):
+        bounds = [None, 'root/a', 'root/a/', 'root/a/b-', 'root/a/c', 'root/a-b', 'root/b',
+                  'root/z/', 'root/z/y/x', 'root/é', '~']
+        for lo in bounds:
+            for hi in bounds:
+                expected = [path for path in self.files
+                            if (lo is None or path >= lo) and (hi is None or path < hi)]
+                scanned = [path for path, _ in ic.scan_tree('root', lo, hi)]
+                self.assertEqual(scanned, expected, (lo, hi))
+
+    def test_single_file(self):
+        self.assertEqual([path for path, _ in ic.scan_tree('root/b')], ['root/b'])
+        self.assertEqual(list(ic.scan_tree('root/b', lo='root/c')), [])
+        self.assertEqual(list(ic.scan_tree('missing')), [])
+
+
+class MergeTests(unittest.TestCase):
+
+    def test_merge_sorted(self):
+        baseline = [('a', 1), ('c', 3), ('d', 4)]
+        scanned = [('b', 'st-b'), ('c', 'st-c'), ('e', 'st-e')]
+        self.assertEqual(list(ic.merge_sorted(baseline, scanned)), [
+            ('a', 1, None, False),
+            ('b', None, 'st-b', True),
+            ('c', 3, 'st-c', True),
+            ('d', 4, None, False),
+            ('e', None, 'st-e', True)
+        ])
+        self.assertEqual(list(ic.merge_sorted([], [])), [])
+
+    def test_unique_sorted(self):
+        merged = ic.unique_sorted([('a', 1), ('c', 1)], [('a', 2), ('b', 2), ('c', 2)])
+        self.assertEqual(list(merged), [('a', 1), ('b', 2), ('c', 1)])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,189 @@
+"""
+Tests for scheduling checks
+"""
+
+import os
+import unittest
+from unittest import mock
+
+import integrity_checker as ic
+from tests.support import TempDirTestCase
+
+
+class StopMonitor(Exception):
+    """Raised by the fake clock to end a monitor loop"""
+
+
+def run_monitor(checker, loop, until):
+    """
+    Run a monitor loop on a fake clock where checks take no time
+
+    Returns:
+        list: (time, paths or range, tier) of every check, where paths is
+              None for a check of everything
+    """
+    clock = [0.0]
+    checks = []
+
+    def sleep(seconds):
+        clock[0] += seconds
+        if clock[0] > until:
+            raise StopMonitor
+
+    checker.check_integrity = lambda: checks.append((clock[0], None, None))
+    checker.check_targets = lambda targets, tier=None: checks.append(
+        (clock[0], [target['path'] for target in targets], tier))
+    checker.check_range = lambda lo, hi: checks.append((clock[0], (lo, hi), None))
+    with mock.patch.object(ic.time, 'monotonic', lambda: clock[0]), \
+            mock.patch.object(ic.time, 'sleep', sleep):
+        try:
+            loop()
+        except StopMonitor:
+            pass
+    return checks
+
+
+class ScheduleTests(TempDirTestCase):
+
+    def test_paths_are_checked_at_their_own_intervals(self):
+        checker = self.checker(monitored_files=[{'path': 'fast', 'check_interval': 10},
+                                                {'path': 'slow', 'check_interval': 30}])
+        self.assertEqual(run_monitor(checker, checker.monitor_schedule, 60), [
+            (0, None, None), (10, ['fast'], None), (20, ['fast'], None),
+            (30, None, None), (40, ['fast'], None), (50, ['fast'], None), (60, None, None)
+        ])
+        self.assertEqual(checker.overruns.summary()['overruns'], 0)
+
+    def test_check_targets_covers_only_its_paths(self):
+        for path in ('fast/a', 'slow/b', 'slow/c'):
+            self.write(path, path)
+        checker = self.checker(monitored_files=[{'path': 'fast', 'check_interval': 10},
+                                                {'path': 'slow/c'}],
+                               monitor_paths=['slow'])
+        checker.create_baseline()
+        self.write('fast/a', b'changed')
+        self.write('slow/b', b'changed')
+        self.write('slow/c', b'changed')
+        self.write('slow/new', b'new')
+        _, fast, single = checker.monitor_targets()
+        report = checker.check_targets([fast])
+        self.assertEqual(report['scope'], ['fast'])
+        self.assertEqual(([change['file'] for change in report['changes']], report['new_files']),
+                         (['fast/a'], []))
+        self.assertIn('fast', checker.last_full_checks)
+        report = checker.check_targets([single])
+        self.assertEqual([change['file'] for change in report['changes']], ['slow/c'])
+        self.assertEqual((report['missing_files'], report['new_files']), ([], []))
+
+    def test_metadata_and_content_tiers(self):
+        checker = self.checker(monitored_files=[{'path': 'data', 'monitor_metadata': True,
+                                                 'check_interval': 10, 'hash_interval': 30}])
+        self.assertEqual(run_monitor(checker, checker.monitor_schedule, 60), [
+            (0, ['data'], 'content'), (10, ['data'], 'metadata'), (20, ['data'], 'metadata'),
+            (30, ['data'], 'content'), (40, ['data'], 'metadata'), (50, ['data'], 'metadata'),
+            (60, ['data'], 'content')
+        ])
+
+    def test_metadata_tier_only_hashes_changed_stats(self):
+        self.write('data/a', b'a')
+        self.write('data/b', b'b')
+        checker = self.checker(monitored_files=[{'path': 'data', 'monitor_metadata': True}])
+        checker.create_baseline()
+        target, = checker.monitor_targets()
+        report = checker.check_targets([target], 'metadata')
+        self.assertEqual((report['tier'], report['mode'], report['files_rehashed']),
+                         ('metadata', 'quick', 0))
+        os.chmod('data/a', 0o600)
+        report = checker.check_targets([target], 'metadata')
+        self.assertEqual([change['file'] for change in report['metadata_changes']], ['data/a'])
+        self.assertEqual((report['changes'], report['files_rehashed']), ([], 1))
+        report = checker.check_targets([target], 'content')
+        self.assertEqual((report['mode'], report['files_rehashed']), ('full', 2))
+
+
+class RollingTests(TempDirTestCase):
+
+    def setUp(self):
+        super().setUp()
+        for index in range(10):
+            self.write(f"data/f{index:02d}", str(index))
+        self.checker_ = self.checker(monitor_paths=['data'], rolling_slices=3, rolling_period=30)
+        self.checker_.create_baseline()
+
+    def test_boundaries_split_the_baseline(self):
+        self.assertEqual(self.checker_.rolling_boundaries(3),
+                         [(None, 'data/f03'), ('data/f03', 'data/f06'), ('data/f06', None)])
+        self.assertEqual(len(self.checker_.rolling_boundaries(100)), 10)
+        self.assertEqual(self.checker_.rolling_boundaries(0), [(None, None)])
+
+    def test_ranges_together_cover_a_full_check(self):
+        self.write('data/f01', b'changed')
+        self.write('data/f07', b'changed')
+        os.remove('data/f04')
+        self.write('data/a', b'before every baseline path')
+        self.write('data/z', b'after every baseline path')
+        found = []
+        for lo, hi in self.checker_.rolling_boundaries(3):
+            report = self.checker_.check_range(lo, hi)
+            self.assertEqual((report['range'], report['mode']), ([lo, hi], 'full'))
+            found.append(([change['file'] for change in report['changes']],
+                          report['missing_files'], report['new_files']))
+        self.assertEqual(found, [(['data/f01'], [], ['data/a']),
+                                 ([], ['data/f04'], []),
+                                 (['data/f07'], [], ['data/z'])])
+
+    def test_one_slice_per_tick(self):
+        checker = self.checker_
+        checks = run_monitor(checker, checker.monitor_rolling, 50)
+        ranges = checker.rolling_boundaries(3)
+        self.assertEqual(checks, [(tick * 10, ranges[tick % 3], None) for tick in range(6)])
+        self.assertIsNotNone(checker.last_full_check)
+
+
+class OverrunTrackerTests(unittest.TestCase):
+
+    def test_on_time_ticks(self):
+        tracker = ic.OverrunTracker()
+        tracker.start(10.0, now=10.5)
+        finished = tracker.finish(10.5, now=12.0)
+        self.assertEqual(tracker.next_due(10.0, 5.0, finished), 15.0)
+        summary = tracker.summary()
+        self.assertEqual((summary['ticks'], summary['overruns'], summary['skipped_ticks']), (1, 0, 0))
+        self.assertEqual(summary['lag'], 0.5)
+        self.assertEqual(summary['last_duration'], 1.5)
+
+    def test_overrun_skips_elapsed_ticks(self):
+        tracker = ic.OverrunTracker()
+        tracker.start(0.0, now=0.0)
+        finished = tracker.finish(0.0, now=12.0)
+        # Due at 5 and 10 passed while running: both are skipped
+        self.assertEqual(tracker.next_due(0.0, 5.0, finished), 15.0)
+        self.assertEqual(tracker.summary()['skipped_ticks'], 2)
+        # Finishing exactly on the next due time is an overrun too
+        tracker.start(15.0, now=15.0)
+        self.assertEqual(tracker.next_due(15.0, 5.0, tracker.finish(15.0, now=20.0)), 25.0)
+        self.assertEqual(tracker.summary()['overruns'], 2)
+
+    def test_batches_count_every_job(self):
+        tracker = ic.OverrunTracker()
+        for batch in range(4):
+            start = batch * 100.0
+            tracker.start(start, now=start + 1, count=3)
+            finished = tracker.finish(start + 1, now=start + 20)
+            for interval in (5.0, 5.0, 60.0):
+                tracker.next_due(start, interval, finished)
+        summary = tracker.summary()
+        self.assertEqual(summary['ticks'], 12)
+        self.assertEqual(summary['overruns'], 8)
+        self.assertLessEqual(summary['overruns'], summary['ticks'])
+        self.assertEqual(summary['last_duration'], 19.0)
+
+    def test_zero_interval_never_overruns(self):
+        tracker = ic.OverrunTracker()
+        tracker.start(0.0, now=0.0)
+        self.assertEqual(tracker.next_due(0.0, 0, tracker.finish(0.0, now=5.0)), 0.0)
+        self.assertEqual(tracker.summary()['overruns'], 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,140 @@
+"""
+Tests for the HMAC-authenticated digests kept in extended attributes
+"""
+
+import errno
+import hashlib
+import os
+import unittest
+from unittest import mock
+
+import integrity_checker as ic
+from tests.support import TempDirTestCase
+
+
+def xattrs_supported():
+    if not ic.XattrDigests.available():
+        return False
+    try:
+        with open('probe', 'w'):
+            pass
+        os.setxattr('probe', 'user.probe', b'1')
+        return True
+    except OSError as e:
+        if e.errno in ic.XattrDigests.UNSUPPORTED:
+            return False
+        raise
+    finally:
+        os.remove('probe')
+
+
+class XattrDigestTests(TempDirTestCase):
+
+    def setUp(self):
+        super().setUp()
+        if not xattrs_supported():
+            self.skipTest("user xattrs unsupported here")
+        self.write('file', b'content')
+        self.digests = ic.XattrDigests(b'k' * 32)
+
+    def test_round_trip_needs_key_and_ctime(self):
+        st = os.stat('file')
+        written = self.digests.put('file', st, 'sha256', 'ab' * 32)
+        self.assertIsNotNone(written)
+        self.assertEqual(self.digests.get('file', written, 'sha256', written.st_ctime_ns), 'ab' * 32)
+        # No ctime anchor, or a different one: not trusted
+        self.assertIsNone(self.digests.get('file', written, 'sha256', None))
+        self.assertIsNone(self.digests.get('file', written, 'sha256', st.st_ctime_ns - 1))
+        # Another key does not authenticate it
+        other = ic.XattrDigests(b'x' * 32)
+        self.assertIsNone(other.get('file', written, 'sha256', written.st_ctime_ns))
+
+    def test_forged_value_is_rejected(self):
+        st = os.stat('file')
+        forged = f"{st.st_size}:{st.st_mtime_ns}:{st.st_ino}:{'cd' * 32}:{'0' * 64}"
+        os.setxattr('file', 'user.integrity.sha256', forged.encode())
+        st = os.stat('file')
+        self.assertIsNone(self.digests.get('file', st, 'sha256', st.st_ctime_ns))
+
+    def test_unchanged_value_is_not_rewritten(self):
+        written = self.digests.put('file', os.stat('file'), 'sha256', 'ab' * 32)
+        self.assertTrue(self.digests.own_write('file'))
+        self.assertIsNone(self.digests.put('file', written, 'sha256', 'ab' * 32))
+        self.assertEqual(os.stat('file').st_ctime_ns, written.st_ctime_ns)
+
+    def test_own_write_detects_later_changes(self):
+        self.digests.put('file', os.stat('file'), 'sha256', 'ab' * 32)
+        self.write('file', b'changed')
+        self.assertFalse(self.digests.own_write('file'))
+        self.assertFalse(self.digests.own_write('never-written'))
+
+    def test_key_file_is_private_and_stable(self):
+        key = ic.XattrDigests.load_key('xattr.key')
+        self.assertEqual(os.stat('xattr.key').st_mode & 0o777, 0o600)
+        self.assertEqual(ic.XattrDigests.load_key('xattr.key'), key)
+
+    def test_unsupported_devices_are_remembered(self):
+        st = os.stat('file')
+        self.digests._failed(st, OSError(errno.ENOTSUP, 'unsupported'))
+        self.assertIsNone(self.digests.put('file', st, 'sha256', 'ab' * 32))
+
+
+class XattrCheckTests(TempDirTestCase):
+
+    def setUp(self):
+        super().setUp()
+        if not xattrs_supported():
+            self.skipTest("user xattrs unsupported here")
+
+    def test_restored_xattr_does_not_hide_a_rewrite(self):
+        self.write('data/a', b'hello')
+        checker = self.checker(monitor_paths=['data'], verification_mode='quick',
+                               xattr_digests=True, xattr_key_file='xattr.key')
+        checker.create_baseline()
+        stored = os.getxattr('data/a', 'user.integrity.sha256')
+        st = os.stat('data/a')
+        self.write('data/a', b'HELLO')
+        os.utime('data/a', ns=(st.st_atime_ns, st.st_mtime_ns))
+        os.setxattr('data/a', 'user.integrity.sha256', stored)
+        report = checker.check_integrity()
+        self.assertEqual([change['file'] for change in report['changes']], ['data/a'])
+
+    def test_recreated_baseline_reuses_stored_digests(self):
+        self.write('data/a', b'hello')
+        self.write('data/b', b'world')
+        checker = self.checker(monitor_paths=['data'], hash_workers=1,
+                               xattr_digests=True, xattr_key_file='xattr.key')
+        checker.create_baseline()
+        self.write('data/b', b'WORLD')
+        with mock.patch.object(checker, '_hash_batch', wraps=checker._hash_batch) as batch:
+            checker.create_baseline()
+        self.assertEqual(batch.call_args.args[0], ['data/b'])
+        self.assertEqual(checker.open_baseline().get('data/a')['hash'],
+                         hashlib.sha256(b'hello').hexdigest())
+
+    def test_checks_never_read_stored_digests(self):
+        self.write('data/a', b'hello')
+        for mode in ('quick', 'full'):
+            with self.subTest(mode=mode):
+                checker = self.checker(monitor_paths=['data'], verification_mode=mode,
+                                       xattr_digests=True, xattr_key_file='xattr.key')
+                checker.create_baseline()
+                os.chmod('data/a', 0o600)
+                with mock.patch.object(ic.XattrDigests, 'get') as get:
+                    self.assertEqual(checker.check_integrity()['changes'], [])
+                    checker.check_paths(['data/a'])
+                get.assert_not_called()
+
+    def test_checks_do_not_rewrite_unchanged_attributes(self):
+        self.write('data/a', b'hello')
+        checker = self.checker(monitor_paths=['data'], verification_mode='full',
+                               xattr_digests=True, xattr_key_file='xattr.key')
+        checker.create_baseline()
+        ctime = os.stat('data/a').st_ctime_ns
+        for _ in range(3):
+            self.assertEqual(checker.check_integrity()['changes'], [])
+        self.assertEqual(os.stat('data/a').st_ctime_ns, ctime)
+
+
+if __name__ == '__main__':
+    unittest.main()